@@ -0,0 +1,329 @@
+import os
+import argparse
+import copy
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+
+from strategy_backtest import load_data
+
+FEE = 0.0005
+# Sell price factor of a cryptocurrency that dropped out of the CoinMarketCap top 200
+DELISTED_FACTOR = 0.8
+
+
+class PricePanel:
+    """
+    Price matrix (dates x names) built once from the loaded data, together with
+    the per-period returns the strategy simulations reuse.
+
+    - prices: price of each name on each date, NaN where it is not listed
+    - valid: True where a price exists
+    - into_growth: price[t] / price[t - 1], 1.0 where undefined
+    - next_price: first price on or after each date (base of "cumulativeOC")
+    - rank: position of the name in the snapshot of each date, breaks score ties
+
+    Expects data from load_data(), which drops duplicate symbols and zero
+    prices, so the simulations see the same prices and tie order as
+    run_backtest().
+    """
+
+    def __init__(self, full_df, fee=FEE):
+        matrix = full_df.pivot(index="openTime", columns="name", values="price").sort_index()
+
+        self.dates = matrix.index
+        self.names = matrix.columns
+        self.prices = matrix.to_numpy(dtype=float)
+        self.valid = ~np.isnan(self.prices)
+        self.next_price = matrix.bfill().to_numpy(dtype=float)
+
+        rank = full_df.assign(rank=full_df.groupby("openTime").cumcount())
+        self.rank = (
+            rank.pivot(index="openTime", columns="name", values="rank")
+            .reindex(index=self.dates, columns=self.names)
+            .to_numpy(dtype=float)
+        )
+
+        self.into_growth = np.ones_like(self.prices)
+        self.into_growth[1:] = self.prices[1:] / self.prices[:-1]
+        self.into_growth[np.isnan(self.into_growth)] = 1.0
+
+        self.fee = fee
+
+    def date_index(self, date):
+        """
+        Index of the first date on or after `date`.
+        """
+        return int(self.dates.searchsorted(pd.Timestamp(date)))
+
+    def column(self, name):
+        return int(self.names.get_loc(name))
+
+    def subset(self, first, last):
+        """
+        Panel restricted to the names listed between dates first and last
+        (inclusive indices). All dates are kept, so date indices stay valid.
+        """
+        columns = self.valid[first:last + 1].any(axis=0)
+
+        panel = copy.copy(self)
+        panel.names = self.names[columns]
+        panel.prices = self.prices[:, columns]
+        panel.valid = self.valid[:, columns]
+        panel.next_price = self.next_price[:, columns]
+        panel.rank = self.rank[:, columns]
+        panel.into_growth = self.into_growth[:, columns]
+        return panel
+
+
+def _simulate(panel, rows, score_fn, initial_capital, top_n):
+    """
+    Run the top N strategy over a batch of paths.
+
+    On every row, all holdings are sold and the N names with the highest score
+    are bought with equal capital; the last row is valued at market prices.
+    Holdings earn the growth into the next row of their path; a name missing
+    on that row is sold at 80 % of its last price.
+
+    :param rows: int array (paths x steps) of panel date indices visited by each path
+    :param score_fn: score_fn(step, dates) -> (paths x names) scores, -inf if not buyable
+    :return: final portfolio value of each path
+    """
+    n_paths, n_steps = rows.shape
+    n = min(top_n, len(panel.names))
+    paths = np.arange(n_paths)[:, None]
+    fee = panel.fee
+
+    wealth = np.full(n_paths, float(initial_capital))
+    value = wealth.copy()
+
+    for step in range(n_steps):
+        dates = rows[:, step]
+
+        # Sell all holdings bought on the previous row
+        if step:
+            listed = panel.valid[dates[:, None], chosen]
+            growth = panel.into_growth[dates[:, None], chosen]
+            realized = np.where(listed, growth * (1 - fee), DELISTED_FACTOR - fee) / (1 + fee)
+            wealth = cash + capital * np.where(picked, realized, 0.0).sum(axis=1)
+
+        # Buy top N, ties in the order of the snapshot
+        scores = score_fn(step, dates)
+        chosen = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+
+        # Only rows where tied names straddle the cut need the full ordering
+        lowest = scores[paths, chosen].min(axis=1, keepdims=True)
+        straddled = np.isfinite(lowest[:, 0]) & (
+            (scores == lowest).sum(axis=1) > (scores[paths, chosen] == lowest).sum(axis=1)
+        )
+        if straddled.any():
+            chosen[straddled] = np.lexsort(
+                (panel.rank[dates[straddled]], -scores[straddled]), axis=1
+            )[:, :n]
+        picked = np.isfinite(scores[paths, chosen])
+        count = picked.sum(axis=1)
+
+        capital = wealth / top_n
+        cash = wealth - capital * count
+        value = cash + capital * count / (1 + fee)
+
+    return value
+
+
+def _batches(size, batch_size):
+    return np.array_split(np.arange(size), max(1, -(-size // batch_size)))
+
+
+def walk_forward(panel, window, step=1, initial_capital=5000, top_n=40,
+                 start_date=None, end_date=None, batch_size=256):
+    """
+    Backtest every window of `window` dates between start_date and end_date,
+    starting a new window each `step` dates. Windows are simulated together
+    in vectorized batches over the same price matrix, each batch restricted
+    to the names listed during its windows.
+
+    :return: DataFrame with start, end, strategy and BTC final values per window
+    """
+    if window < 2:
+        raise ValueError("Window must span at least 2 dates.")
+    if step < 1:
+        raise ValueError("Step must be at least 1.")
+    if top_n < 1:
+        raise ValueError("top_n must be at least 1.")
+
+    first = panel.date_index(start_date) if start_date else 0
+    last = panel.dates.searchsorted(pd.Timestamp(end_date), side="right") if end_date else len(panel.dates)
+    starts = np.arange(first, last - window + 1, step)
+    if starts.size == 0:
+        raise ValueError("Date range is shorter than the window.")
+
+    strategy = []
+    for batch in _batches(starts.size, batch_size):
+        batch_starts = starts[batch]
+        rows = batch_starts[:, None] + np.arange(1, window)
+        batch_panel = panel.subset(batch_starts[0], rows[-1, -1])
+        base = batch_panel.next_price[batch_starts]
+
+        def score_fn(step, dates):
+            # Cumulative change from the first price within the window
+            scores = batch_panel.prices[dates] / base
+            return np.where(batch_panel.valid[dates], scores, -np.inf)
+
+        strategy.append(_simulate(batch_panel, rows, score_fn, initial_capital, top_n))
+
+    btc = panel.prices[:, panel.column("BTC")]
+    return pd.DataFrame({
+        "start": panel.dates[starts],
+        "end": panel.dates[starts + window - 1],
+        "strategy": np.concatenate(strategy),
+        "BTC": initial_capital * btc[starts + window - 1] / btc[starts],
+    })
+
+
+def bootstrap(panel, start_date, end_date, samples=1000, block=4, initial_capital=5000,
+              top_n=40, seed=None, batch_size=1000):
+    """
+    Monte Carlo robustness check: build `samples` synthetic paths of the same
+    length as [start_date, end_date] by resampling blocks of `block` consecutive
+    weeks (whole cross sections, so correlations between coins are kept) from
+    that range, and run the strategy on each path in vectorized batches.
+
+    The momentum score, the strategy returns and BTC buy and hold all use the
+    growth into each sampled week, so every path is one return sequence.
+
+    :return: DataFrame with strategy and BTC final values per path
+    """
+    if samples < 1:
+        raise ValueError("Samples must be at least 1.")
+    if block < 1:
+        raise ValueError("Block must be at least 1.")
+    if top_n < 1:
+        raise ValueError("top_n must be at least 1.")
+
+    first = panel.date_index(start_date)
+    last = panel.dates.searchsorted(pd.Timestamp(end_date), side="right") - 1
+    # Sampled weeks need the growth into them from within the range
+    pool = np.arange(first + 1, last + 1)
+    n_steps = last - first
+    if pool.size < 2:
+        raise ValueError("Date range is too short to resample.")
+
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n_steps // block)
+    block_starts = rng.integers(0, pool.size, size=(samples, n_blocks))
+    offsets = (block_starts[:, :, None] + np.arange(block)) % pool.size
+    rows = pool[offsets.reshape(samples, -1)[:, :n_steps]]
+
+    range_panel = panel.subset(first, last)
+
+    strategy = []
+    for batch in _batches(samples, batch_size):
+        score = np.ones((batch.size, len(range_panel.names)))
+
+        def score_fn(step, dates):
+            # Cumulative change along the synthetic path
+            score[:] *= range_panel.into_growth[dates]
+            return np.where(range_panel.valid[dates], score, -np.inf)
+
+        strategy.append(_simulate(range_panel, rows[batch], score_fn, initial_capital, top_n))
+
+    # Held from the first sampled week, like the strategy
+    btc = panel.into_growth[:, panel.column("BTC")]
+    return pd.DataFrame({
+        "strategy": np.concatenate(strategy),
+        "BTC": initial_capital * btc[rows[:, 1:]].prod(axis=1),
+    })
+
+
+def summarize(outcomes, initial_capital=5000):
+    """
+    Distribution of final values of the strategy compared with BTC buy and hold.
+    """
+    summary = outcomes[["strategy", "BTC"]].describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95])
+    summary.loc["P(> BTC)"] = [(outcomes["strategy"] > outcomes["BTC"]).mean(), np.nan]
+    summary.loc["P(loss)"] = [
+        (outcomes["strategy"] < initial_capital).mean(),
+        (outcomes["BTC"] < initial_capital).mean(),
+    ]
+    return summary
+
+
+def plot_distribution(outcomes, title, top_n=40, show=True):
+    if not show:
+        plt.switch_backend("Agg")
+
+    plt.figure(figsize=(12, 6))
+    bins = np.histogram_bin_edges(outcomes[["strategy", "BTC"]].to_numpy().ravel(), bins=50)
+    plt.hist(outcomes["strategy"], bins=bins, alpha=0.5, label=f"Top {top_n}")
+    plt.hist(outcomes["BTC"], bins=bins, color=[0.9290, 0.6940, 0.1250], alpha=0.7, label="BTC")
+    plt.title(title)
+    plt.xlabel('Final Portfolio Value (USD)')
+    plt.ylabel('Paths')
+    plt.legend()
+    plt.grid(True)
+
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Walk-forward and bootstrap robustness of the top N strategy")
+    parser.add_argument("mode", choices=["walk-forward", "bootstrap"])
+    parser.add_argument("--start-date",
+                        help="Default: whole history for walk-forward, 2020-12-13 for bootstrap")
+    parser.add_argument("--end-date",
+                        help="Default: whole history for walk-forward, 2021-12-31 for bootstrap")
+    parser.add_argument("--window", type=int, default=55,
+                        help="Walk-forward window length in weeks")
+    parser.add_argument("--step", type=int, default=1,
+                        help="Walk-forward step between windows in weeks")
+    parser.add_argument("--samples", type=int, default=5000,
+                        help="Number of bootstrap paths")
+    parser.add_argument("--block", type=int, default=4,
+                        help="Bootstrap block length in weeks")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--top-n", type=int, default=40)
+    parser.add_argument("--initial-capital", type=float, default=5000)
+    parser.add_argument("--output", metavar="FILE",
+                        help="Save the outcome of every path to an Excel file")
+    parser.add_argument("--no-show", action="store_true",
+                        help="Do not open the plot window")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    file_path = os.path.join('backtesting', 'coinmarketcap_historical_data.csv')
+    panel = PricePanel(load_data(file_path))
+
+    if args.mode == "walk-forward":
+        outcomes = walk_forward(
+            panel, args.window, args.step, args.initial_capital, args.top_n,
+            args.start_date, args.end_date,
+        )
+        title = f"Walk-forward, {len(outcomes)} windows of {args.window} weeks"
+    else:
+        # Bullrun 2021
+        args.start_date = args.start_date or "2020-12-13"
+        args.end_date = args.end_date or "2021-12-31"
+        outcomes = bootstrap(
+            panel, args.start_date, args.end_date, args.samples, args.block,
+            args.initial_capital, args.top_n, args.seed,
+        )
+        title = f"Bootstrap of {args.start_date} - {args.end_date}, {len(outcomes)} paths"
+
+    print(title)
+    print(summarize(outcomes, args.initial_capital).round(2))
+
+    if args.output:
+        outcomes.to_excel(args.output, index=False)
+        print(f"Data has been saved to {args.output}")
+
+    plot_distribution(outcomes, title, args.top_n, show=not args.no_show)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,205 +1,421 @@
 import os
+import argparse
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
 from collections import defaultdict
 import matplotlib.pyplot as plt
 import mplcursors
 
-# Load data
-# file_path = os.path.join('backtesting', 'trading_pairs_klines.xlsx')
-# df = pd.read_excel(file_path)
-
-file_path = os.path.join('backtesting', 'coinmarketcap_historical_data.csv')
-# Read the CSV file into a DataFrame
-full_df = pd.read_csv(file_path)
-
-# Convert the string-encoded "openTime" column to datetime objects
-# The parameter 'format="%Y%m%d"' specifies the date format,
-# e.g. "20130602" -> June 2, 2013
-full_df["openTime"] = pd.to_datetime(full_df["openTime"], format="%Y%m%d")
-
-# Define the range of dates you want to filter
-# You can choose any date format recognized by pandas (e.g. "YYYY-MM-DD")
-
-# Bullrun 2017
-# start_date = "2017-02-19"
-# end_date   = "2017-12-31"
-
-# Bullrun 2021
-start_date = "2020-12-13"
-end_date   = "2021-12-31"
-
-# Create a boolean mask to select rows where the "openTime" column
-# falls within the specified range [start_date, end_date]
-mask = (full_df["openTime"] >= start_date) & (full_df["openTime"] <= end_date)
-
-# Filter the DataFrame using the mask
-df = full_df.loc[mask]
-
-# Calculate the cumulative percentage change for each cryptocurrency
-# Compare each price to the FIRST price for that crypto
-# The first day will show 0.0 (no change from itself),
-# and subsequent days will show the percentage change from that first price
-df["cumulativeOC"] = df.groupby("name")["price"].transform(
-    lambda x: (x / x.iloc[0] - 1) * 100
-)
-
-initial_capital = 5000
-top_n = 40
-
-# Unique dates
-unique_dates = (
-    df['openTime']
-    .drop_duplicates()
-    .sort_values()
-    .reset_index(drop=True)  # vytvorí nový 0-based index
-)
-
-# Initialize variables
-portfolio = defaultdict(float)  # crypto -> unitsHeld
-cash = initial_capital
-
-# Results dateFrame
-results = pd.DataFrame(columns=['openTime', 'name', 'Action', 'price', 'Units', 'Value'])
-portfolio_history = pd.DataFrame(columns=['openTime', 'PortfolioValue'])
-
-# Iterate through unique dates
-for i, current_date in enumerate(unique_dates):
-    if i >= 1:
-        # Data for the current date
-        day_data = df[df['openTime'] == current_date]
-        
-        # Data for the previous date
-        prev_day_data = df[df['openTime'] == unique_dates[i - 1]]
-        # Sort cryptocurrencies by 'cumulativeOC' descending
-        day_data = day_data.sort_values('cumulativeOC', ascending=False)
-        
-        # Select top N cryptocurrencies
-        top_n_cryptos = day_data.head(top_n)
-
-        # Sell all holdings
-        for crypto_name in list(portfolio.keys()):
-            sell_data = day_data[day_data['name'] == crypto_name]
-            if not sell_data.empty:
-                sell_price = sell_data['price'].iloc[0] * (1 - 0.0005)
-                units_held = portfolio[crypto_name]
-                sell_value = units_held * sell_price
 
-                # Record the sale
-                results = pd.concat([
-                    results,
-                    pd.DataFrame({
-                        'openTime': [current_date],
-                        'name': [crypto_name],
-                        'Action': ['Sell'],
-                        'price': [sell_price],
-                        'Units': [units_held],
-                        'Value': [sell_value]
-                    })
-                ])
+class PhaseProfiler:
+    """
+    Collects wall time, CPU time and peak memory allocated by named phases.
+    A phase entered several times (e.g. inside the backtest loop) accumulates
+    its times and keeps the highest peak. The peak is measured above the
+    memory already in use when the phase starts, so data loaded earlier does
+    not count towards later phases.
+
+    Time and memory are measured in separate passes over the same code, since
+    tracemalloc slows down every allocation and would inflate the timings.
+    Outside of measure(), phases cost nothing.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.phases = {}
+        self.total = {"wall": None, "cpu": None, "peak": None}
+        self._pass_calls = {}
+        self._pass_peak = 0
+
+    @contextmanager
+    def measure(self, mode):
+        """
+        Measure the phases run inside the block, mode is "time" or "memory".
+        """
+        self.mode = mode
+        self._pass_calls = {}
+        self._pass_peak = 0
+        if mode == "memory":
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            if mode == "time":
+                self.total["wall"] = time.perf_counter() - wall_start
+                self.total["cpu"] = time.process_time() - cpu_start
+            else:
+                # Phases reset the peak, so keep the highest one they saw
+                self.total["peak"] = max(self._pass_peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            self.mode = None
+
+    @contextmanager
+    def phase(self, name):
+        if self.mode is None:
+            yield
+            return
+
+        if self.mode == "memory":
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+
+            stats = self.phases.setdefault(
+                name, {"calls": 0, "wall": None, "cpu": None, "peak": None}
+            )
+            self._pass_calls[name] = self._pass_calls.get(name, 0) + 1
+            stats["calls"] = self._pass_calls[name]
+
+            if self.mode == "time":
+                stats["wall"] = (stats["wall"] or 0.0) + wall
+                stats["cpu"] = (stats["cpu"] or 0.0) + cpu
             else:
-                # Some cryptocurrencies are removed from the CoinMarketCap top 200 over time, 
-                # so we calculate their value with a 20% reduction.
-                sell_data = prev_day_data[prev_day_data['name'] == crypto_name]
-                sell_price = sell_data['price'].iloc[0] * (0.8 - 0.0005)
-                units_held = portfolio[crypto_name]
-                sell_value = units_held * sell_price
+                peak = tracemalloc.get_traced_memory()[1]
+                self._pass_peak = max(self._pass_peak, peak)
+                stats["peak"] = max(stats["peak"] or 0, peak - memory_start)
+
+    def report(self):
+        """
+        Table of the phases, followed by the whole run ("total") and the time
+        spent outside of every phase ("unaccounted").
+        """
+        def cell(value, scale=1):
+            return f"{'-':>12}" if value is None else f"{value / scale:>12.3f}"
+
+        def line(name, calls, wall, cpu, peak):
+            return f"{name:<20}{calls:>8}{cell(wall)}{cell(cpu)}{cell(peak, 2**20)}"
+
+        lines = [f"{'Phase':<20}{'Calls':>8}{'Wall [s]':>12}{'CPU [s]':>12}{'Peak [MiB]':>12}"]
+        for name, stats in self.phases.items():
+            lines.append(line(name, stats["calls"], stats["wall"], stats["cpu"], stats["peak"]))
+
+        unaccounted = {}
+        for key in ("wall", "cpu"):
+            if self.total[key] is not None:
+                unaccounted[key] = self.total[key] - sum(
+                    stats[key] or 0.0 for stats in self.phases.values()
+                )
+        lines.append(line("total", "", self.total["wall"], self.total["cpu"], self.total["peak"]))
+        lines.append(line("unaccounted", "", unaccounted.get("wall"), unaccounted.get("cpu"), None))
+        return "\n".join(lines)
+
+
+def load_data(file_path, profiler=None):
+    """
+    Load the CoinMarketCap snapshots CSV (columns openTime, name, price).
+
+    Rows without a usable quote are dropped: a few symbols are shared by two
+    coins on the same date (only the first, higher ranked one is kept) and a
+    few prices are 0 (treated as not listed on that date).
+    """
+    profiler = profiler or PhaseProfiler()
+
+    # Read the CSV file into a DataFrame
+    with profiler.phase("read_csv"):
+        full_df = pd.read_csv(file_path)
+
+    # Convert the string-encoded "openTime" column to datetime objects
+    # The parameter 'format="%Y%m%d"' specifies the date format,
+    # e.g. "20130602" -> June 2, 2013
+    with profiler.phase("to_datetime"):
+        full_df["openTime"] = pd.to_datetime(full_df["openTime"], format="%Y%m%d")
+
+    with profiler.phase("clean_data"):
+        full_df = full_df.drop_duplicates(subset=["openTime", "name"], keep="first")
+        full_df = full_df[full_df["price"] > 0].reset_index(drop=True)
+
+    return full_df
+
+
+def select_window(full_df, start_date, end_date, profiler=None):
+    """
+    Restrict the data to [start_date, end_date] and add the "cumulativeOC" column.
+    """
+    profiler = profiler or PhaseProfiler()
+
+    # Create a boolean mask to select rows where the "openTime" column
+    # falls within the specified range [start_date, end_date]
+    with profiler.phase("window_filter"):
+        mask = (full_df["openTime"] >= start_date) & (full_df["openTime"] <= end_date)
+
+        # Filter the DataFrame using the mask
+        df = full_df.loc[mask].copy()
+
+    # Calculate the cumulative percentage change for each cryptocurrency
+    # Compare each price to the FIRST price for that crypto
+    # The first day will show 0.0 (no change from itself),
+    # and subsequent days will show the percentage change from that first price
+    with profiler.phase("groupby_transform"):
+        df["cumulativeOC"] = df.groupby("name")["price"].transform(
+            lambda x: (x / x.iloc[0] - 1) * 100
+        )
+
+    return df
+
+
+def run_backtest(df, initial_capital=5000, top_n=40, profiler=None):
+    """
+    Each date, sell all holdings and buy the top N cryptocurrencies by "cumulativeOC".
+
+    :return: tuple (portfolio_history, results)
+    """
+    profiler = profiler or PhaseProfiler()
+
+    # Unique dates
+    unique_dates = (
+        df['openTime']
+        .drop_duplicates()
+        .sort_values()
+        .reset_index(drop=True)  # vytvorí nový 0-based index
+    )
+
+    # Initialize variables
+    portfolio = defaultdict(float)  # crypto -> unitsHeld
+    cash = initial_capital
+
+    # Results dateFrame
+    results = pd.DataFrame(columns=['openTime', 'name', 'Action', 'price', 'Units', 'Value'])
+    portfolio_history = pd.DataFrame(columns=['openTime', 'PortfolioValue'])
+
+    # Iterate through unique dates
+    for i, current_date in enumerate(unique_dates):
+        if i >= 1:
+            with profiler.phase("date_filter"):
+                # Data for the current date
+                day_data = df[df['openTime'] == current_date]
+
+                # Data for the previous date
+                prev_day_data = df[df['openTime'] == unique_dates[i - 1]]
+                # Sort cryptocurrencies by 'cumulativeOC' descending,
+                # ties keep the CoinMarketCap rank order of the snapshot
+                day_data = day_data.sort_values('cumulativeOC', ascending=False, kind='stable')
+
+            # Select top N cryptocurrencies
+            top_n_cryptos = day_data.head(top_n)
+
+            # Sell all holdings
+            for crypto_name in list(portfolio.keys()):
+                with profiler.phase("sell_lookup"):
+                    sell_data = day_data[day_data['name'] == crypto_name]
+                    if not sell_data.empty:
+                        sell_price = sell_data['price'].iloc[0] * (1 - 0.0005)
+                    else:
+                        # Some cryptocurrencies are removed from the CoinMarketCap top 200 over time,
+                        # so we calculate their value with a 20% reduction.
+                        sell_data = prev_day_data[prev_day_data['name'] == crypto_name]
+                        sell_price = sell_data['price'].iloc[0] * (0.8 - 0.0005)
+                    units_held = portfolio[crypto_name]
+                    sell_value = units_held * sell_price
 
                 # Record the sale
-                results = pd.concat([
-                    results,
-                    pd.DataFrame({
-                        'openTime': [current_date],
-                        'name': [crypto_name],
-                        'Action': ['Sell'],
-                        'price': [sell_price],
-                        'Units': [units_held],
-                        'Value': [sell_value]
-                    })
-                ])
+                with profiler.phase("concat"):
+                    results = pd.concat([
+                        results,
+                        pd.DataFrame({
+                            'openTime': [current_date],
+                            'name': [crypto_name],
+                            'Action': ['Sell'],
+                            'price': [sell_price],
+                            'Units': [units_held],
+                            'Value': [sell_value]
+                        })
+                    ])
 
                 # Update cash
-            cash += sell_value
-
-        # Clear the portfolio
-        portfolio.clear()
-
-        # Buy top N cryptocurrencies
-        if top_n > 0:
-            capital_per_crypto = cash / top_n
-            for _, row in top_n_cryptos.iterrows():
-                crypto_name = row['name']
-                buy_price = row['price'] * (1 + 0.0005)
-                units_to_buy = capital_per_crypto / buy_price
-                buy_value = units_to_buy * buy_price
-
-                # Record the purchase
-                results = pd.concat([
-                    results,
-                    pd.DataFrame({
-                        'openTime': [current_date],
-                        'name': [crypto_name],
-                        'Action': ['Buy'],
-                        'price': [buy_price],
-                        'Units': [units_to_buy],
-                        'Value': [buy_value]
-                    })
-                ])
-
-                # Update cash and portfolio
-                cash -= buy_value
-                portfolio[crypto_name] += units_to_buy
-
-        # Calculate portfolio value
-        day_value = cash
-        for crypto_name, units in portfolio.items():
-            current_data = day_data[day_data['name'] == crypto_name]
-            if not current_data.empty:
-                current_price = current_data['price'].iloc[0]
-                day_value += units * current_price
-
-        portfolio_history = pd.concat([
-            portfolio_history,
-            pd.DataFrame({'openTime': [current_date], 'PortfolioValue': [day_value]})
-        ])
+                cash += sell_value
+
+            # Clear the portfolio
+            portfolio.clear()
+
+            # Buy top N cryptocurrencies
+            if top_n > 0:
+                capital_per_crypto = cash / top_n
+                with profiler.phase("buy"):
+                    buy_rows = list(top_n_cryptos.iterrows())
+                for _, row in buy_rows:
+                    with profiler.phase("buy"):
+                        crypto_name = row['name']
+                        buy_price = row['price'] * (1 + 0.0005)
+                        units_to_buy = capital_per_crypto / buy_price
+                        buy_value = units_to_buy * buy_price
+
+                    # Record the purchase
+                    with profiler.phase("concat"):
+                        results = pd.concat([
+                            results,
+                            pd.DataFrame({
+                                'openTime': [current_date],
+                                'name': [crypto_name],
+                                'Action': ['Buy'],
+                                'price': [buy_price],
+                                'Units': [units_to_buy],
+                                'Value': [buy_value]
+                            })
+                        ])
+
+                    # Update cash and portfolio
+                    cash -= buy_value
+                    portfolio[crypto_name] += units_to_buy
+
+            # Calculate portfolio value
+            with profiler.phase("valuation"):
+                day_value = cash
+                for crypto_name, units in portfolio.items():
+                    current_data = day_data[day_data['name'] == crypto_name]
+                    if not current_data.empty:
+                        current_price = current_data['price'].iloc[0]
+                        day_value += units * current_price
+        else:
+            day_value = initial_capital
+
+        with profiler.phase("concat"):
+            portfolio_history = pd.concat([
+                portfolio_history,
+                pd.DataFrame({'openTime': [current_date], 'PortfolioValue': [day_value]})
+            ])
+
+    portfolio_history["PortfolioValue"] = pd.to_numeric(portfolio_history["PortfolioValue"], errors="coerce").round(0)
+
+    return portfolio_history, results
+
+
+def plot_results(df, portfolio_history, initial_capital=5000, top_n=40, show=True):
+    """
+    Plot the strategy portfolio value against BTC buy and hold.
+    With show=False the figure is built headless and closed instead of shown.
+    """
+    if not show:
+        plt.switch_backend("Agg")
+
+    # Plot results
+    plt.figure(figsize=(12, 6))
+    bars = plt.bar(
+        portfolio_history["openTime"],
+        portfolio_history["PortfolioValue"],
+        width=4.0,
+        alpha=0.5,
+        label=f"Top {top_n}"
+    )
+    if show:
+        cursor = mplcursors.cursor(bars)
+
+    # BTC-specific calculations
+    btc_data = df[df['name'] == 'BTC']
+    sum_oc_btc = btc_data['cumulativeOC'] * 0.01 * initial_capital + initial_capital
+    plt.bar(
+        btc_data['openTime'],
+        sum_oc_btc,
+        color=[0.9290, 0.6940, 0.1250],
+        width=4.0,
+        alpha=0.7,
+        label='BTC')
+
+    # EMA of portfolio value
+    portfolio_history['EMA14'] = portfolio_history['PortfolioValue'].ewm(span=14, adjust=False).mean()
+    plt.plot(portfolio_history['openTime'], portfolio_history['EMA14'], label='EMA14')
+    plt.xlabel('Weeks')
+    plt.ylabel('Portfolio Value (USD)')
+    plt.legend()
+    plt.grid(True)
+
+    if show:
+        plt.show()
     else:
-        portfolio_history = pd.concat([
-            portfolio_history,
-            pd.DataFrame({'openTime': [current_date], 'PortfolioValue': [initial_capital]})
-        ])
-
-portfolio_history["PortfolioValue"] = pd.to_numeric(portfolio_history["PortfolioValue"], errors="coerce").round(0)
-
-# Plot results
-plt.figure(figsize=(12, 6))
-bars = plt.bar(
-    portfolio_history["openTime"], 
-    portfolio_history["PortfolioValue"], 
-    width=4.0,             
-    alpha=0.5, 
-    label="Top 40"
-)
-cursor = mplcursors.cursor(bars)
-
-# BTC-specific calculations
-btc_data = df[df['name'] == 'BTC']
-sum_oc_btc = btc_data['cumulativeOC'] * 0.01 * 5000 + 5000
-plt.bar(
-    btc_data['openTime'], 
-    sum_oc_btc, 
-    color=[0.9290, 0.6940, 0.1250],
-    width=4.0, 
-    alpha=0.7, 
-    label='BTC')
-
-# EMA of portfolio value
-portfolio_history['EMA14'] = portfolio_history['PortfolioValue'].ewm(span=14, adjust=False).mean()
-plt.plot(portfolio_history['openTime'], portfolio_history['EMA14'], label='EMA14')
-plt.xlabel('Weeks')
-plt.ylabel('Portfolio Value (USD)')
-plt.legend()
-plt.grid(True)
-plt.show()
-
-#portfolio_history.to_excel("portfolio_history.xlsx", index=False)
-#results.to_excel("results.xlsx", index=False)
+        plt.gcf().canvas.draw()
+        plt.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Top N momentum strategy backtest")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print wall time and CPU time per phase, do not show the plot")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Print peak memory allocated per phase (measured in a separate run), "
+                             "do not show the plot")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="Write a cProfile dump (pstats format, usable by snakeviz/flameprof) "
+                             "from a separate run, do not show the plot")
+    parser.add_argument("--no-show", action="store_true",
+                        help="Do not open the plot window")
+    return parser.parse_args()
+
+
+def run(profiler, show=True):
+    # Load data
+    # file_path = os.path.join('backtesting', 'trading_pairs_klines.xlsx')
+    # df = pd.read_excel(file_path)
+
+    file_path = os.path.join('backtesting', 'coinmarketcap_historical_data.csv')
+    full_df = load_data(file_path, profiler)
+
+    # Define the range of dates you want to filter
+    # You can choose any date format recognized by pandas (e.g. "YYYY-MM-DD")
+
+    # Bullrun 2017
+    # start_date = "2017-02-19"
+    # end_date   = "2017-12-31"
+
+    # Bullrun 2021
+    start_date = "2020-12-13"
+    end_date   = "2021-12-31"
+
+    df = select_window(full_df, start_date, end_date, profiler)
+
+    initial_capital = 5000
+    top_n = 40
+
+    portfolio_history, results = run_backtest(df, initial_capital, top_n, profiler)
+
+    with profiler.phase("plot"):
+        plot_results(df, portfolio_history, initial_capital, top_n, show=show)
+
+    #portfolio_history.to_excel("portfolio_history.xlsx", index=False)
+    #results.to_excel("results.xlsx", index=False)
+
+
+def main():
+    args = parse_args()
+
+    profiler = PhaseProfiler()
+    profiling = args.profile or args.profile_memory or args.profile_output
+
+    if not profiling:
+        run(profiler, show=not args.no_show)
+        return
+
+    # Every measurement gets its own headless run, so that neither cProfile
+    # nor tracemalloc overhead ends up in the phase timings
+    if args.profile:
+        with profiler.measure("time"):
+            run(profiler, show=False)
+
+    if args.profile_output:
+        c_profiler = cProfile.Profile()
+        c_profiler.enable()
+        run(profiler, show=False)
+        c_profiler.disable()
+        c_profiler.dump_stats(args.profile_output)
+        print(f"cProfile stats have been saved to {args.profile_output}")
+
+    if args.profile_memory:
+        with profiler.measure("memory"):
+            run(profiler, show=False)
+
+    if args.profile or args.profile_memory:
+        print(profiler.report())
+
+
+if __name__ == "__main__":
+    main()
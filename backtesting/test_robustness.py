@@ -0,0 +1,57 @@
+import warnings
+import pandas as pd
+import numpy as np
+import pytest
+
+from strategy_backtest import select_window, run_backtest
+from robustness import PricePanel, walk_forward, bootstrap
+
+
+def make_data(names, weeks=30, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-03", periods=weeks, freq="7D")
+    rows = []
+    for name in names:
+        price = 100 * np.cumprod(rng.lognormal(0, 0.1, weeks))
+        for date, value in zip(dates, price):
+            rows.append({"openTime": date, "name": name, "price": value})
+    return pd.DataFrame(rows)
+
+
+def test_bootstrap_btc_only_matches_buy_and_hold():
+    panel = PricePanel(make_data(["BTC"]), fee=0)
+    outcomes = bootstrap(panel, "2021-01-03", "2021-07-25", samples=200, block=4, top_n=1, seed=1)
+    np.testing.assert_allclose(outcomes["strategy"], outcomes["BTC"])
+
+
+def test_walk_forward_matches_run_backtest():
+    full_df = make_data(["BTC"] + [f"C{i}" for i in range(12)])
+    # Delistings, late listings and tied scores
+    full_df = full_df[~((full_df["name"] == "C1") & (full_df["openTime"] > "2021-03-01"))]
+    full_df = full_df[~((full_df["name"] == "C2") & (full_df["openTime"] < "2021-02-15"))]
+    full_df.loc[full_df["name"].isin(["C3", "C4", "C5"]), "price"] = 1.0
+    full_df = full_df.reset_index(drop=True)
+
+    panel = PricePanel(full_df)
+    outcomes = walk_forward(panel, 20, step=5, top_n=5)
+
+    for row in outcomes.itertuples():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            portfolio_history, _ = run_backtest(select_window(full_df, row.start, row.end), top_n=5)
+        assert round(row.strategy) == portfolio_history["PortfolioValue"].iloc[-1]
+
+
+@pytest.mark.parametrize("kwargs", [{"window": 0}, {"window": 1}, {"step": 0}, {"top_n": 0}])
+def test_walk_forward_rejects_invalid_arguments(kwargs):
+    panel = PricePanel(make_data(["BTC", "C0"]))
+    kwargs = {"window": 10, **kwargs}
+    with pytest.raises(ValueError):
+        walk_forward(panel, **kwargs)
+
+
+@pytest.mark.parametrize("kwargs", [{"block": 0}, {"samples": 0}, {"top_n": 0}])
+def test_bootstrap_rejects_invalid_arguments(kwargs):
+    panel = PricePanel(make_data(["BTC", "C0"]))
+    with pytest.raises(ValueError):
+        bootstrap(panel, "2021-01-03", "2021-07-25", **kwargs)
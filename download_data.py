@@ -1,114 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import pandas as pd
 import requests
 
-def get_USDT_trading_pairs():
-
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-    response = requests.get(url)
-    data = response.json()
+SPOT_BASE_URL = "https://api.binance.com/api/v3"
+FUTURES_BASE_URL = "https://fapi.binance.com/fapi/v1"
+
+KLINE_COLUMNS = [
+    "openTime",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "closeTime",
+    "quoteAssetVolume",
+    "numberOfTrades",
+    "takerBuyBaseAssetVolume",
+    "takerBuyQuoteAssetVolume",
+    "ignore",
+]
+
+
+def get_exchange_info(base_url):
+    """
+    Fetch exchangeInfo from the spot or futures Binance API.
 
-    trading_pairs = [
-        symbol["symbol"]
-        for symbol in data["symbols"]
-        if symbol["quoteAsset"] == "USDT" and "_" not in symbol["symbol"]
-    ]
-    return trading_pairs
+    :param base_url: SPOT_BASE_URL or FUTURES_BASE_URL
+    :return: Decoded JSON response
+    """
+    response = requests.get(f"{base_url}/exchangeInfo")
+    response.raise_for_status()
+    return response.json()
 
 
-def get_klines(symbol, interval, start_date, end_date):
+@lru_cache(maxsize=1)
+def resolve_universe():
     """
-    Fetch kline data from Binance API for a specific symbol and interval.
+    Work out, for every USDT futures pair, which market its klines should be
+    fetched from and since when data exists.
 
-    :param symbol: Trading pair symbol, e.g., 'BTCUSDT'
-    :param interval: Kline interval, e.g., '1d'
-    :param start_date: Start date in 'DD.MM.YYYY' format
-    :param end_date: End date in 'DD.MM.YYYY' format
-    :return: DataFrame containing kline data
+    Spot and futures exchangeInfo are requested once, in parallel, and the
+    resulting map is cached for the lifetime of the process. Pairs actively
+    trading on spot are read from spot (longer history), all others from
+    futures starting at their onboardDate.
+
+    Spot exchangeInfo has no listing date, so a spot pair may turn out to have
+    no data in an older range; download_data() then falls back to futures.
+
+    :return: dict mapping symbol -> {"market": "spot" | "futures",
+             "onboardTime": futures onboardDate in milliseconds or None if unknown}
     """
-    base_url = "https://api.binance.com/api/v3/klines"
-    start_timestamp = start_date
-    end_timestamp = end_date
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures_info, spot_info = executor.map(
+            get_exchange_info, [FUTURES_BASE_URL, SPOT_BASE_URL]
+        )
+
+    spot_trading = {
+        symbol["symbol"]
+        for symbol in spot_info["symbols"]
+        if symbol["status"] == "TRADING"
+    }
+
+    universe = {}
+    for symbol in futures_info["symbols"]:
+        name = symbol["symbol"]
+        if symbol["quoteAsset"] != "USDT" or "_" in name:
+            continue
+
+        universe[name] = {
+            "market": "spot" if name in spot_trading else "futures",
+            "onboardTime": symbol.get("onboardDate"),
+        }
+    return universe
+
+
+def get_USDT_trading_pairs():
+    return list(resolve_universe())
+
 
+def _fetch_klines(base_url, symbol, interval, start_date, end_date):
     params = {
         "symbol": symbol,
         "interval": interval,
-        "startTime": start_timestamp,
-        "endTime": end_timestamp,
+        "startTime": start_date,
+        "endTime": end_date,
         "limit": 1000,  # Maximum number of records per request
     }
     try:
-        response = requests.get(base_url, params=params)
+        response = requests.get(f"{base_url}/klines", params=params)
+        response.raise_for_status()
         data = response.json()
+    except (requests.RequestException, ValueError):
+        return pd.DataFrame(columns=KLINE_COLUMNS)
 
-        # Create DataFrame from the received data
-        df = pd.DataFrame(
-            data,
-            columns=[
-                "openTime",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "closeTime",
-                "quoteAssetVolume",
-                "numberOfTrades",
-                "takerBuyBaseAssetVolume",
-                "takerBuyQuoteAssetVolume",
-                "ignore",
-            ],
-        )
+    # Create DataFrame from the received data
+    df = pd.DataFrame(data, columns=KLINE_COLUMNS)
 
-        # Convert timestamps to datetime objects
-        df["openTime"] = pd.to_datetime(df["openTime"], unit="ms")
-        df["closeTime"] = pd.to_datetime(df["closeTime"], unit="ms")
-    except:
-        df = []
+    # Convert timestamps to datetime objects
+    df["openTime"] = pd.to_datetime(df["openTime"], unit="ms")
+    df["closeTime"] = pd.to_datetime(df["closeTime"], unit="ms")
     return df
 
 
-def get_klines_futures(symbol, interval, start_date, end_date):
+def get_klines(symbol, interval, start_date, end_date):
+    """
+    Fetch kline data from Binance spot API for a specific symbol and interval.
 
-    base_url = "https://fapi.binance.com/fapi/v1/klines"
-    start_timestamp = start_date
-    end_timestamp = end_date
+    :param symbol: Trading pair symbol, e.g., 'BTCUSDT'
+    :param interval: Kline interval, e.g., '1d'
+    :param start_date: Start time in milliseconds
+    :param end_date: End time in milliseconds
+    :return: DataFrame containing kline data (empty if the request failed)
+    """
+    return _fetch_klines(SPOT_BASE_URL, symbol, interval, start_date, end_date)
 
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "startTime": start_timestamp,
-        "endTime": end_timestamp,
-        "limit": 1000,
-    }
-    try:
-        response = requests.get(base_url, params=params)
-        data = response.json()
 
-        df = pd.DataFrame(
-            data,
-            columns=[
-                "openTime",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "closeTime",
-                "quoteAssetVolume",
-                "numberOfTrades",
-                "takerBuyBaseAssetVolume",
-                "takerBuyQuoteAssetVolume",
-                "ignore",
-            ],
-        )
+def get_klines_futures(symbol, interval, start_date, end_date):
+    """
+    Fetch kline data from Binance futures API, see get_klines().
+    """
+    return _fetch_klines(FUTURES_BASE_URL, symbol, interval, start_date, end_date)
 
-        df["openTime"] = pd.to_datetime(df["openTime"], unit="ms")
-        df["closeTime"] = pd.to_datetime(df["closeTime"], unit="ms")
-    except:
-        df = []
 
-    return df
+KLINES_FETCHERS = {"spot": get_klines, "futures": get_klines_futures}
 
 
 def download_data():
@@ -125,21 +141,26 @@ def download_data():
     start_time = int(datetime.strptime(start_date, "%d.%m.%Y").timestamp() * 1000)
     end_time = int(datetime.strptime(end_date, "%d.%m.%Y").timestamp() * 1000)
 
-    # Fetch all trading pairs
-    trading_pairs = get_USDT_trading_pairs()
+    # Resolve the market of every trading pair once
+    universe = resolve_universe()
 
     all_data = []
 
-    for pair in trading_pairs:
+    for pair, source in universe.items():
+
+        on_futures = source["onboardTime"] is None or source["onboardTime"] <= end_time
+
+        # Skip futures pairs listed after the end of the range
+        if source["market"] == "futures" and not on_futures:
+            continue
 
-        # 1st Try to fetch kline data from spot market
-        klines = get_klines(pair, "1w", start_time, end_time)
+        klines = KLINES_FETCHERS[source["market"]](pair, "1w", start_time, end_time)
 
-        if klines.empty:
-            # 2nd Try to fetch kline data from futures market
+        # Pairs listed on spot after the range may still have futures data
+        if len(klines) < 2 and source["market"] == "spot" and on_futures:
             klines = get_klines_futures(pair, "1w", start_time, end_time)
 
-        if klines.empty or len(klines) < 2:
+        if len(klines) < 2:
             continue
 
         first_close = klines.iat[0, 4]